@@ -0,0 +1,96 @@
+"""Time each output backend against the formatted xlsx workbook.
+
+Usage: python benchmark_outputs.py [--symbols N] [--legs N]
+"""
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from output_backends import BACKENDS
+from position_schema import apply_position_schema
+from tda_api import write_tda_workbook
+
+def make_portfolio(num_symbols, legs_per_symbol, seed=0):
+    """Build a synthetic TDA-style portfolio with one equity row per symbol.
+
+    The frame is untyped, as built from the API dicts; pass it through
+    apply_position_schema to get the frame the fetchers return.
+    """
+    rng = np.random.default_rng(seed)
+    rows = []
+    for s in range(num_symbols):
+        symbol = f"SYM{s:03d}"
+        spot = float(rng.uniform(20, 500))
+        rows.append({
+            'Symbol': symbol,
+            'Description': symbol,
+            'Asset Type': 'EQUITY',
+            'Put/Call': '',
+            'Quantity': 100.0,
+            'Market Value': spot * 100,
+            'Average Price': spot,
+            'Average Long Price': spot,
+            'Expiration Date': '',
+            'Call/Put Price': None,
+        })
+        for _ in range(legs_per_symbol):
+            put_call = rng.choice(['PUT', 'CALL'])
+            strike = round(spot * rng.uniform(0.8, 1.2))
+            expiry = f"{rng.integers(1, 13):02d}/{rng.integers(1, 29):02d}/2025"
+            rows.append({
+                'Symbol': symbol,
+                'Description': f"{symbol} {expiry} ${strike} {put_call.title()}",
+                'Asset Type': 'OPTION',
+                'Put/Call': put_call,
+                'Quantity': float(rng.choice([-2, -1, 1, 2])),
+                'Market Value': float(rng.uniform(-500, 500)),
+                'Average Price': float(rng.uniform(0.5, 10)),
+                'Average Long Price': None,
+                'Expiration Date': expiry,
+                'Call/Put Price': float(strike),
+            })
+    return pd.DataFrame(rows)
+
+def time_call(func, repeat):
+    """Return the best wall time of func over repeat runs."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--symbols", type=int, default=50)
+    parser.add_argument("--legs", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    portfolio_data = apply_position_schema(make_portfolio(args.symbols, args.legs))
+    print(f"{len(portfolio_data)} rows across {args.symbols} symbols")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        base_name = os.path.join(tmp, "BENCH")
+        # Time the workbook build directly so the file is not opened
+        results = {'xlsx': time_call(lambda: write_tda_workbook(f"{base_name}.xlsx", portfolio_data, {}), args.repeat)}
+        for name, backend in BACKENDS.items():
+            if name == 'xlsx':
+                continue
+            with contextlib.redirect_stdout(io.StringIO()) as output:
+                available = backend(base_name, portfolio_data)
+                if available:
+                    results[name] = time_call(lambda: backend(base_name, portfolio_data), args.repeat)
+            if not available:
+                print(f"Skipping {name}: {output.getvalue().strip()}")
+
+    print(f"{'backend':<10}{'seconds':>10}{'vs xlsx':>10}")
+    for name, seconds in results.items():
+        print(f"{name:<10}{seconds:>10.3f}{results['xlsx'] / seconds:>9.1f}x")
+
+if __name__ == "__main__":
+    main()
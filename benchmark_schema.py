@@ -0,0 +1,47 @@
+"""Compare untyped portfolio frames with apply_position_schema frames.
+
+Usage: python benchmark_schema.py [--rows N]
+"""
+import argparse
+import time
+from benchmark_outputs import make_portfolio, time_call
+from position_schema import apply_position_schema
+from spreadsheet_formatter import split_positions
+
+def filter_and_sort(data):
+    """Run the equity, put and call filters of populate_template* on data."""
+    data[data['Asset Type'].isin(['EQUITY', 'COLLECTIVE_INVESTMENT', 'EQ'])]
+    data[data['Put/Call'] == 'PUT'].sort_values(by=['Expiration Date', 'Call/Put Price'])
+    data[data['Put/Call'] == 'CALL'].sort_values(by=['Expiration Date', 'Call/Put Price'])
+
+def per_symbol(data):
+    """Split data by symbol and filter each group, as the workbook writers did."""
+    grouped = data.groupby('Symbol', observed=True)
+    for symbol in grouped.groups:
+        filter_and_sort(grouped.get_group(symbol))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--legs", type=int, default=99, help="option legs per symbol")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    raw = make_portfolio(max(args.rows // (args.legs + 1), 1), args.legs)
+    start = time.perf_counter()
+    typed = apply_position_schema(raw)
+    ingest = time.perf_counter() - start
+    print(f"{len(raw)} rows, schema applied in {ingest * 1000:.1f} ms")
+
+    rows = [
+        ("memory (MB)", *(frame.memory_usage(deep=True).sum() / 2**20 for frame in (raw, typed))),
+        ("filter + sort (ms)", *(time_call(lambda: filter_and_sort(frame), args.repeat) * 1000 for frame in (raw, typed))),
+        ("per-symbol (ms)", *(time_call(lambda: per_symbol(frame), args.repeat) * 1000 for frame in (raw, typed))),
+        ("split_positions (ms)", *(time_call(lambda: split_positions(frame), args.repeat) * 1000 for frame in (raw, typed))),
+    ]
+    print(f"{'':<22}{'untyped':>10}{'typed':>10}{'ratio':>8}")
+    for name, before, after in rows:
+        print(f"{name:<22}{before:>10.2f}{after:>10.2f}{before / after:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import pandas as pd
+from spreadsheet_formatter import (
+    sanitize_sheet_name,
+    format_sheet,
+    populate_template_tda,
+    split_positions
+)
+from output_backends import DEFAULT_BACKENDS, sorted_symbols, write_outputs
+from position_schema import apply_position_schema
+from tda_api import fetch_all_tda_positions
+from etrade_api import fetch_all_etrade_positions
+
+# Map broker-specific asset types onto the TDA names used by the templates
+ASSET_TYPES = {'EQ': 'EQUITY', 'COLLECTIVE_INVESTMENT': 'EQUITY', 'OPTN': 'OPTION'}
+LEG_KEYS = ['Symbol', 'Asset Type', 'Expiration Date', 'Call/Put Price', 'Put/Call']
+CONTRACT_MULTIPLIER = 100
+
+def normalize_positions(portfolio_data, broker, account_id):
+    """Convert a typed TDA or E*TRADE portfolio frame to the shared leg layout.
+
+    E*TRADE values options at lastTrade * quantity, the per-share premium,
+    while Schwab's marketValue includes the contract multiplier, so E*TRADE
+    option market values are scaled to match. Accounts are shown by broker
+    and last 4 digits, as in the per-broker workbooks.
+    """
+    asset_type = portfolio_data['Asset Type'].astype(object).replace(ASSET_TYPES)
+    market_value = portfolio_data['Market Value'].fillna(0.0)
+    if broker == 'ETRADE':
+        market_value = market_value.where(asset_type != 'OPTION', market_value * CONTRACT_MULTIPLIER)
+    return pd.DataFrame({
+        'Broker': broker,
+        'Account': f"{broker}{str(account_id)[-4:]}",
+        'Symbol': portfolio_data['Symbol'].astype(object),
+        'Description': portfolio_data['Description'].astype(object),
+        'Asset Type': asset_type,
+        'Put/Call': portfolio_data['Put/Call'].astype(object).fillna('').str.upper(),
+        'Expiration Date': portfolio_data['Expiration Date'],
+        'Call/Put Price': portfolio_data['Call/Put Price'],
+        'Quantity': portfolio_data['Quantity'].fillna(0.0),
+        'Average Price': portfolio_data['Average Price'],
+        'Market Value': market_value,
+    })
+
+def net_positions(legs):
+    """Net equity and option legs across accounts in a single groupby.
+
+    Legs are netted per underlying and, for options, per (expiry, strike,
+    put/call). Average Price is the quantity-weighted cost of the legs that
+    have one, and is NaN when those legs fully offset each other or none of
+    them has a price.
+    """
+    priced = legs['Average Price'].notna()
+    netted = (
+        legs.assign(
+            Cost=(legs['Quantity'] * legs['Average Price']).where(priced, 0.0),
+            PricedQuantity=legs['Quantity'].where(priced, 0.0),
+        )
+        .groupby(LEG_KEYS, dropna=False, sort=False, observed=True)
+        .agg(
+            Quantity=('Quantity', 'sum'),
+            Cost=('Cost', 'sum'),
+            PricedQuantity=('PricedQuantity', 'sum'),
+            Accounts=('Account', 'nunique'),
+            **{'Market Value': ('Market Value', 'sum')},
+        )
+        .reset_index()
+    )
+    quantity = netted['Quantity']
+    priced_quantity = netted.pop('PricedQuantity')
+    netted['Average Price'] = netted.pop('Cost') / priced_quantity.where(priced_quantity != 0)
+    # The templates write these with write_number, which rejects NaN
+    netted['Average Long Price'] = netted['Average Price'].where(quantity > 0, 0.0).fillna(0.0)
+    netted['Average Short Price'] = netted['Average Price'].where(quantity < 0, 0.0).fillna(0.0)
+    return netted
+
+def summarize_underlyings(netted):
+    """Total the net exposure of each underlying."""
+    quantity = netted['Quantity']
+    return (
+        netted.assign(
+            **{
+                'Equity Quantity': quantity.where(netted['Asset Type'] == 'EQUITY', 0.0),
+                'Net Calls': quantity.where(netted['Put/Call'] == 'CALL', 0.0),
+                'Net Puts': quantity.where(netted['Put/Call'] == 'PUT', 0.0),
+                'Open Legs': quantity != 0,
+            }
+        )
+        .groupby('Symbol', observed=True)[['Equity Quantity', 'Net Calls', 'Net Puts', 'Open Legs', 'Market Value']]
+        .sum()
+        .reset_index()
+    )
+
+def write_consolidated_workbook(output_file, netted, legs, current_prices):
+    """Write the combined workbook.
+
+    Summary, Net Legs and Accounts sheets list the netted exposure and the
+    per-account legs behind it, followed by one template sheet per symbol
+    filled with the open net legs.
+    """
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        summarize_underlyings(netted).to_excel(writer, sheet_name='Summary', index=False)
+        netted.to_excel(writer, sheet_name='Net Legs', index=False)
+        drill_down = legs.sort_values(['Symbol', 'Broker', 'Account', 'Expiration Date', 'Call/Put Price'])
+        drill_down.to_excel(writer, sheet_name='Accounts', index=False)
+        writer.sheets['Accounts'].autofilter(0, 0, len(drill_down), len(drill_down.columns) - 1)
+
+        open_legs = netted[netted['Quantity'] != 0]
+        positions = split_positions(open_legs)
+        avg_prices = (
+            open_legs[open_legs['Asset Type'] == 'EQUITY']
+            .groupby('Symbol', observed=True)['Average Price']
+            .mean()
+        )
+        for symbol in sorted_symbols(open_legs):
+            sanitized_symbol = sanitize_sheet_name(symbol)
+            avg_price = avg_prices.get(symbol, float('nan'))
+
+            writer.book.add_worksheet(sanitized_symbol)
+            format_sheet(writer, sanitized_symbol, avg_price, 'ALL')
+
+            current_price = current_prices.get(symbol, 0.0)
+            if current_price:
+                writer.sheets[sanitized_symbol].write_number('B3', current_price)
+
+            populate_template_tda(writer, sanitized_symbol, *positions[symbol])
+
+def fetch_consolidated_legs():
+    """Fetch every Schwab and E*TRADE account as normalized legs.
+
+    Returns (legs, current_prices); legs is empty if no account had data.
+    """
+    print("Fetching Schwab accounts...")
+    portfolios = [('TDA', account_id, result) for account_id, result in fetch_all_tda_positions().items()]
+    print("\nFetching E*TRADE accounts...")
+    portfolios += [('ETRADE', account_id, result) for account_id, result in fetch_all_etrade_positions().items()]
+
+    current_prices = {}
+    frames = []
+    for broker, account_id, (portfolio_data, prices) in portfolios:
+        current_prices.update(prices)
+        if not portfolio_data.empty:
+            frames.append(normalize_positions(portfolio_data, broker, account_id))
+
+    if not frames:
+        return pd.DataFrame(), current_prices
+    # Each account was validated when it was fetched; warning again here
+    # would repeat every warning under the last broker's heading
+    return apply_position_schema(pd.concat(frames, ignore_index=True), validate=False), current_prices
+
+def process_consolidated_spreadsheets(backends=DEFAULT_BACKENDS):
+    """Fetch every Schwab and E*TRADE account and write the netted risk view."""
+    try:
+        legs, current_prices = fetch_consolidated_legs()
+        if legs.empty:
+            print("No data available")
+            return False
+
+        netted = net_positions(legs)
+        print(f"\nNetted {len(legs)} legs from {legs['Account'].nunique()} accounts into {len(netted)} positions")
+
+        return write_outputs(
+            netted, "Consolidated", backends,
+            lambda output_file: write_consolidated_workbook(output_file, netted, legs, current_prices)
+        )
+
+    except Exception as e:
+        print(f"An error occurred while processing consolidated spreadsheets: {str(e)}")
+        return False
+
+if __name__ == "__main__":
+    process_consolidated_spreadsheets()
@@ -6,11 +6,13 @@ import os
 import webbrowser
 from spreadsheet_formatter import (
     clear_screen, 
-    open_file, 
     sanitize_sheet_name,
     format_sheet,
-    populate_template
+    populate_template,
+    split_positions
 )
+from output_backends import DEFAULT_BACKENDS, write_outputs
+from position_schema import apply_position_schema
 
 # Load environment variables
 load_dotenv()
@@ -131,33 +133,90 @@ def fetch_portfolio(session, account_key):
                 
                 positions.append(position_data)
         
-        return pd.DataFrame(positions) if positions else pd.DataFrame(), current_prices
+        return apply_position_schema(pd.DataFrame(positions)) if positions else pd.DataFrame(), current_prices
     
     except ET.ParseError as e:
         print(f"Error parsing XML response: {e}")
         return pd.DataFrame(), {}
 
-def process_etrade_spreadsheets(selected_account=None):
+def authenticate_with_retry():
+    """Authenticate and fetch the account list, offering to retry on failure.
+
+    Returns (session, account_keys), or (None, {}) if the user gives up.
+    """
+    while True:
+        try:
+            session = authenticate()
+            return session, fetch_accounts(session)
+        except Exception as auth_error:
+            print(f"\nAuthentication error: {str(auth_error)}")
+            retry = input("\nWould you like to try authenticating again? (y/n): ")
+            if retry.lower() != 'y':
+                return None, {}
+            print("\nRetrying authentication...")
+
+def fetch_all_etrade_positions():
+    """Fetch portfolios for every filtered E*TRADE account.
+
+    Returns a dict of account id to (portfolio_data, current_prices).
+    """
+    session, account_keys = authenticate_with_retry()
+    if session is None:
+        return {}
+
+    portfolios = {}
+    for account_id, account_key in account_keys.items():
+        print(f"\nFetching account: {account_id}")
+        try:
+            portfolios[account_id] = fetch_portfolio(session, account_key)
+        except Exception as api_error:
+            print(f"API error occurred for account {account_id}: {str(api_error)}")
+    return portfolios
+
+def write_etrade_workbook(output_file, portfolio_data, current_prices, account_id):
+    """Write the formatted E*TRADE workbook with one sheet per symbol."""
+    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
+        positions = split_positions(portfolio_data)
+        sorted_symbols = sorted(positions, 
+                             key=lambda x: (x[0].isdigit(), x))
+
+        # Equity trade price per symbol, else the mean over all its rows
+        means = (
+            portfolio_data.assign(**{
+                'Equity Price': portfolio_data['Trade Price'].where(portfolio_data['Asset Type'] == 'EQ'),
+            })
+            .groupby('Symbol', observed=True)[['Trade Price', 'Equity Price']]
+            .mean()
+        )
+        avg_prices = means['Equity Price'].fillna(means['Trade Price'])
+        
+        for symbol in sorted_symbols:
+            sanitized_symbol = sanitize_sheet_name(symbol)
+            avg_price = avg_prices[symbol]
+            
+            writer.book.add_worksheet(sanitized_symbol)
+            format_sheet(writer, sanitized_symbol, avg_price, account_id)
+            
+            # Write current price to B3
+            current_price = current_prices.get(symbol, 0.0)
+            if current_price:
+                worksheet = writer.sheets[sanitized_symbol]
+                worksheet.write_number('B3', current_price)
+            
+            populate_template(writer, sanitized_symbol, *positions[symbol])
+
+def process_etrade_spreadsheets(selected_account=None, backends=DEFAULT_BACKENDS):
     """Process and create E*TRADE spreadsheets."""
     try:
         print("Starting E*TRADE spreadsheet update...")
         
         # Initial authentication attempt
-        session = None
-        while session is None:
-            try:
-                session = authenticate()
-                account_keys = fetch_accounts(session)
-                if not account_keys:
-                    print("No accounts found")
-                    return False
-            except Exception as auth_error:
-                print(f"\nAuthentication error: {str(auth_error)}")
-                retry = input("\nWould you like to try authenticating again? (y/n): ")
-                if retry.lower() != 'y':
-                    return False
-                print("\nRetrying authentication...")
-                continue
+        session, account_keys = authenticate_with_retry()
+        if session is None:
+            return False
+        if not account_keys:
+            print("No accounts found")
+            return False
         
         while True:  # Main account processing loop
             if selected_account is None:
@@ -193,7 +252,7 @@ def process_etrade_spreadsheets(selected_account=None):
             # Process the selected account(s)
             for account_id, account_key in accounts_to_process.items():
                 print(f"\nProcessing account: {account_id}")
-                output_file = f"ETRADE{account_id[-4:]}.xlsx"
+                output_name = f"ETRADE{account_id[-4:]}"
                 
                 try:
                     portfolio_data, current_prices = fetch_portfolio(session, account_key)
@@ -215,38 +274,11 @@ def process_etrade_spreadsheets(selected_account=None):
                         input("\nPress Enter to continue...")
                         continue
                     
-                try:
-                    with pd.ExcelWriter(output_file, engine='xlsxwriter') as writer:
-                        grouped = portfolio_data.groupby('Symbol')
-                        sorted_symbols = sorted(grouped.groups.keys(), 
-                                             key=lambda x: (x[0].isdigit(), x))
-                        
-                        for symbol in sorted_symbols:
-                            sanitized_symbol = sanitize_sheet_name(symbol)
-                            symbol_data = grouped.get_group(symbol)
-                            
-                            avg_price = symbol_data[symbol_data['Asset Type'] == 'EQ']['Trade Price'].mean()
-                            if pd.isna(avg_price):
-                                avg_price = symbol_data['Trade Price'].mean()
-                            
-                            writer.book.add_worksheet(sanitized_symbol)
-                            format_sheet(writer, sanitized_symbol, avg_price, account_id)
-                            
-                            # Write current price to B3
-                            current_price = current_prices.get(symbol, 0.0)
-                            if current_price:
-                                worksheet = writer.sheets[sanitized_symbol]
-                                worksheet.write_number('B3', current_price)
-                            
-                            populate_template(writer, sanitized_symbol, symbol_data)
-                    
-                    print(f"\nSuccessfully created {output_file}")
-                    open_file(output_file)
-                    
-                except PermissionError:
-                    print(f"Error: The file '{output_file}' is open. Please close it and try again.")
+                if not write_outputs(
+                    portfolio_data, output_name, backends,
+                    lambda output_file: write_etrade_workbook(output_file, portfolio_data, current_prices, account_id)
+                ):
                     input("\nPress Enter to continue...")
-                    continue
             
             print("\nE*TRADE spreadsheet update completed!")
             input("\nPress Enter to return to account selection...")
@@ -1,7 +1,13 @@
+import argparse
+import sys
 from tda_api import process_tda_spreadsheets
 from etrade_api import process_etrade_spreadsheets
+from consolidated import process_consolidated_spreadsheets
+from position_index import process_position_reports
 from dotenv import load_dotenv
 from spreadsheet_formatter import clear_screen
+from output_backends import BACKENDS, DEFAULT_BACKENDS
+from schwab_auth import credentials, format_timedelta
 
 def display_menu():
     """Display the main menu."""
@@ -10,7 +16,10 @@ def display_menu():
     print("===================================")
     print("1. Update TDA Spreadsheets")
     print("2. Update E*TRADE Spreadsheets")
-    print("3. Exit")
+    print("3. Update Consolidated Risk View")
+    print("4. Position Reports")
+    print("5. Check Schwab Authentication")
+    print("6. Exit")
     print("===================================")
 
 def display_etrade_submenu(account_keys):
@@ -24,38 +33,95 @@ def display_etrade_submenu(account_keys):
     print(f"{len(account_keys) + 1}. Back to Main Menu")
     print("===================================")
 
-def main():
+def display_auth_health():
+    """Display the Schwab token status from tokens.json."""
+    health = credentials.check_health()
+    print("\nSchwab Authentication Status")
+    print("===================================")
+    print(f"Status: {health['status'].upper()}")
+    if health['access_expires_in'] is not None:
+        print(f"Access token expires in: {format_timedelta(health['access_expires_in'])}")
+        print(f"Browser login required in: {format_timedelta(health['refresh_expires_in'])}")
+    print(health['message'])
+    print("===================================")
+    return health
+
+def parse_args():
+    """Parse command line options."""
+    parser = argparse.ArgumentParser(description="Options Trading Spreadsheet Updater")
+    parser.add_argument(
+        "--output", nargs="+", choices=sorted(BACKENDS), default=list(DEFAULT_BACKENDS),
+        help="one or more output backends (default: xlsx)"
+    )
+    parser.add_argument(
+        "--check-auth", action="store_true",
+        help="print the Schwab token status and exit (non-zero unless tokens are ok)"
+    )
+    return parser.parse_args()
+
+def main(backends=DEFAULT_BACKENDS):
     # Load environment variables at startup
     load_dotenv()
     
+    health = credentials.check_health()
+    if health['status'] in ('warning', 'expired'):
+        print(f"\nSchwab authentication: {health['message']}")
+        input("Use option 5 to re-authenticate. Press Enter to continue...")
+    
     while True:
         display_menu()
-        choice = input("\nEnter your choice (1-3): ")
+        choice = input("\nEnter your choice (1-6): ")
         
         if choice == "1":
             clear_screen()
             print("\nUpdating TDA Spreadsheets...")
-            if process_tda_spreadsheets():
+            if process_tda_spreadsheets(backends=backends):
                 print("\nTDA spreadsheet update completed successfully!")
             input("\nPress Enter to continue...")
             
         elif choice == "2":
             clear_screen()
             print("\nInitializing E*TRADE connection...")
-            if process_etrade_spreadsheets():
+            if process_etrade_spreadsheets(backends=backends):
                 input("\nPress Enter to continue...")
             
         elif choice == "3":
+            clear_screen()
+            print("\nUpdating Consolidated Risk View...")
+            if process_consolidated_spreadsheets(backends=backends):
+                print("\nConsolidated update completed successfully!")
+            input("\nPress Enter to continue...")
+            
+        elif choice == "4":
+            clear_screen()
+            print("\nInitializing position reports...")
+            if not process_position_reports():
+                input("\nPress Enter to continue...")
+            
+        elif choice == "5":
+            clear_screen()
+            health = display_auth_health()
+            if health['status'] != 'ok':
+                reauth = input("\nWould you like to re-authenticate now? (y/n): ")
+                if reauth.lower() == 'y':
+                    credentials.reauthenticate()
+                    display_auth_health()
+            input("\nPress Enter to continue...")
+            
+        elif choice == "6":
             print("\nExiting program. Goodbye!")
             break
             
         else:
-            print("\nInvalid choice. Please enter 1, 2, or 3.")
+            print("\nInvalid choice. Please enter a number from 1 to 6.")
             input("\nPress Enter to continue...")
 
 if __name__ == "__main__":
+    args = parse_args()
+    if args.check_auth:
+        sys.exit(0 if display_auth_health()['status'] == 'ok' else 1)
     try:
-        main()
+        main(backends=args.output)
     except KeyboardInterrupt:
         print("\n\nProgram terminated by user.")
     except Exception as e:
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from spreadsheet_formatter import EQUITY_TYPES, open_file
+
+DEFAULT_BACKENDS = ('xlsx',)
+PAYOFF_ROWS = 35  # Rows 10-44 of the workbook template
+PAYOFF_INCREMENT = 1  # Default value of the I3 increment cell
+
+def sorted_symbols(portfolio_data):
+    """Return the symbols in the same order the workbook sheets use."""
+    return sorted(portfolio_data['Symbol'].unique(), key=lambda x: (x[0].isdigit(), x))
+
+def equity_basis(symbol_data):
+    """Return the equity average price the workbook writes to B9."""
+    equity_data = symbol_data[symbol_data['Asset Type'].isin(EQUITY_TYPES)]
+    if equity_data.empty:
+        return 0.0, 0.0
+    equity_row = equity_data.iloc[0]
+    if equity_row['Quantity'] < 0:
+        basis = equity_row.get('Average Short Price', 0)
+    else:
+        basis = equity_row.get('Average Long Price', 0)
+    if basis is None or pd.isna(basis):
+        basis = 0.0
+    return float(equity_row['Quantity']), float(basis)
+
+def compute_payoff(symbol, symbol_data, increment=PAYOFF_INCREMENT):
+    """Compute the payoff table of the workbook template for one symbol.
+
+    The price ladder starts at half the equity basis and steps by increment,
+    matching columns A, B, N, Z and AA of the formatted sheet. Unlike the
+    sheet, every option leg is included rather than the first 11 calls and
+    10 puts.
+    """
+    equity_quantity, basis = equity_basis(symbol_data)
+    start = np.floor(basis / 2 + 0.5)  # Excel ROUND rounds half away from zero
+    prices = start + np.arange(PAYOFF_ROWS) * increment
+
+    def leg_payoff(put_call, intrinsic):
+        legs = symbol_data[symbol_data['Put/Call'] == put_call]
+        strikes = pd.to_numeric(legs['Call/Put Price'], errors='coerce').to_numpy(dtype=float)
+        quantities = legs['Quantity'].to_numpy(dtype=float)
+        valid = ~np.isnan(strikes)
+        values = intrinsic(prices[:, None], strikes[valid][None, :])
+        return values @ quantities[valid] * 100
+
+    underlying = prices * equity_quantity
+    calls = leg_payoff('CALL', lambda s, k: np.maximum(s - k, 0))
+    puts = leg_payoff('PUT', lambda s, k: np.maximum(k - s, 0))
+    return pd.DataFrame({
+        'Symbol': symbol,
+        'Price': prices,
+        'Underlying': underlying,
+        'Calls': calls,
+        'Puts': puts,
+        'Total': underlying + calls + puts,
+    })
+
+def iter_symbol_frames(portfolio_data):
+    """Yield (symbol, positions, payoff) for each symbol in sheet order."""
+    grouped = portfolio_data.groupby('Symbol', sort=False, observed=True)
+    for symbol in sorted_symbols(portfolio_data):
+        symbol_data = grouped.get_group(symbol)
+        yield symbol, symbol_data, compute_payoff(symbol, symbol_data)
+
+def write_xlsx(base_name, portfolio_data, write_workbook):
+    """Build the formatted workbook and open it."""
+    output_file = f"{base_name}.xlsx"
+    try:
+        write_workbook(output_file)
+    except PermissionError:
+        print(f"Error: The file '{output_file}' is open. Please close it and try again.")
+        return False
+    print(f"Successfully created {output_file}")
+    open_file(output_file)
+    return True
+
+def write_csv(base_name, portfolio_data, write_workbook=None):
+    """Stream positions and payoffs to CSV files, one symbol at a time."""
+    positions_file = f"{base_name}_positions.csv"
+    payoff_file = f"{base_name}_payoff.csv"
+    with open(positions_file, 'w', newline='') as positions_out, open(payoff_file, 'w', newline='') as payoff_out:
+        for i, (_, symbol_data, payoff) in enumerate(iter_symbol_frames(portfolio_data)):
+            symbol_data.to_csv(positions_out, header=(i == 0), index=False)
+            payoff.to_csv(payoff_out, header=(i == 0), index=False)
+    print(f"Successfully created {positions_file} and {payoff_file}")
+    return True
+
+def write_jsonl(base_name, portfolio_data, write_workbook=None):
+    """Stream positions and payoffs to JSON Lines files, one symbol at a time."""
+    positions_file = f"{base_name}_positions.jsonl"
+    payoff_file = f"{base_name}_payoff.jsonl"
+    with open(positions_file, 'w') as positions_out, open(payoff_file, 'w') as payoff_out:
+        for _, symbol_data, payoff in iter_symbol_frames(portfolio_data):
+            positions_out.write(symbol_data.to_json(orient='records', lines=True, date_format='iso'))
+            payoff_out.write(payoff.to_json(orient='records', lines=True))
+    print(f"Successfully created {positions_file} and {payoff_file}")
+    return True
+
+def write_parquet(base_name, portfolio_data, write_workbook=None):
+    """Write positions and payoffs to Parquet files (requires pyarrow)."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        print("Error: Parquet output requires pyarrow. Install it with 'pip install pyarrow'.")
+        return False
+    positions_file = f"{base_name}_positions.parquet"
+    payoff_file = f"{base_name}_payoff.parquet"
+    frames = list(iter_symbol_frames(portfolio_data))
+    pd.concat([symbol_data for _, symbol_data, _ in frames]).to_parquet(positions_file, index=False)
+    pd.concat([payoff for _, _, payoff in frames]).to_parquet(payoff_file, index=False)
+    print(f"Successfully created {positions_file} and {payoff_file}")
+    return True
+
+BACKENDS = {
+    'xlsx': write_xlsx,
+    'csv': write_csv,
+    'parquet': write_parquet,
+    'jsonl': write_jsonl,
+}
+
+def write_outputs(portfolio_data, base_name, backends, write_workbook):
+    """Write portfolio_data with each selected backend.
+
+    write_workbook(output_file) builds the broker-specific workbook and is
+    only called by the xlsx backend. Returns True if every backend succeeded.
+    """
+    success = True
+    for backend in backends:
+        try:
+            success = BACKENDS[backend](base_name, portfolio_data, write_workbook) and success
+        except PermissionError as e:
+            print(f"Error: The file '{e.filename}' is open. Please close it and try again.")
+            success = False
+    return success
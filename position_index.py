@@ -0,0 +1,211 @@
+import time
+import numpy as np
+import pandas as pd
+from spreadsheet_formatter import clear_screen
+from consolidated import fetch_consolidated_legs
+from tda_api import fetch_tda_quotes
+
+REPORT_COLUMNS = ['Broker', 'Account', 'Symbol', 'Put/Call', 'Expiration Date', 'Call/Put Price', 'Quantity']
+
+def estimate_spot_prices(legs, current_prices=None):
+    """Return spot prices from current_prices, else equity market value per share."""
+    equity = legs[(legs['Asset Type'] == 'EQUITY') & (legs['Quantity'] != 0)]
+    totals = equity.groupby('Symbol', observed=True)[['Market Value', 'Quantity']].sum()
+    spot_prices = (totals['Market Value'] / totals['Quantity']).abs().to_dict()
+    spot_prices.update({symbol: price for symbol, price in (current_prices or {}).items() if price})
+    return spot_prices
+
+def short_put_symbols(legs):
+    """Return the underlyings with at least one short put."""
+    short_puts = (legs['Put/Call'] == 'PUT') & (legs['Quantity'] < 0)
+    return set(legs.loc[short_puts, 'Symbol'].astype(object))
+
+class PositionIndex:
+    """Sorted lookups over the normalized legs of one fetch.
+
+    Option legs are kept in one array sorted by expiration and, per
+    (underlying, put/call), in arrays sorted by strike, so each query is a
+    pair of binary searches instead of a scan of the frame. Short puts are
+    also sorted by their distance from spot. Build it once per fetch; it
+    does not track later changes to legs.
+    """
+
+    def __init__(self, legs, current_prices=None):
+        self.legs = legs.reset_index(drop=True)
+        self._quantities = self.legs['Quantity'].to_numpy(dtype=float)
+        self._strike_values = self.legs['Call/Put Price'].to_numpy(dtype=float)
+        expirations = self.legs['Expiration Date'].to_numpy(dtype='datetime64[ns]')
+
+        is_option = (self.legs['Asset Type'] == 'OPTION').to_numpy() & ~np.isnat(expirations)
+        option_rows = np.flatnonzero(is_option)
+        self._expiry_rows = option_rows[np.argsort(expirations[option_rows], kind='stable')]
+        self._expiry_values = expirations[self._expiry_rows]
+
+        # (symbol, put/call) -> (sorted strikes, row positions)
+        self._strikes = {}
+        options = self.legs.iloc[option_rows].sort_values(['Symbol', 'Put/Call', 'Call/Put Price'])
+        rows = options.index.to_numpy()
+        for key, positions in options.groupby(['Symbol', 'Put/Call'], sort=False, observed=True).indices.items():
+            key_rows = rows[positions]
+            self._strikes[key] = (self._strike_values[key_rows], key_rows)
+
+        self.spot_prices = estimate_spot_prices(self.legs, current_prices)
+        self._short_put_distances, self._unpriced_short_puts = self._build_short_put_distances()
+        self._assignment_exposure = self._build_assignment_exposure()
+
+    def _build_assignment_exposure(self):
+        """Total the notional of short option legs per expiration."""
+        short = self.legs.iloc[self._expiry_rows]
+        short = short[short['Quantity'] < 0]
+        return (
+            short.assign(Notional=-short['Quantity'] * short['Call/Put Price'] * 100)
+            .pivot_table(index='Expiration Date', columns='Put/Call', values='Notional', aggfunc='sum', fill_value=0.0,
+                         observed=True)
+            .reindex(columns=['PUT', 'CALL'], fill_value=0.0)
+            .rename(columns={'PUT': 'Short Put Notional', 'CALL': 'Short Call Notional'})
+            .rename_axis(columns=None)
+        )
+
+    def _select(self, rows):
+        return self.legs.iloc[rows]
+
+    def expiring_between(self, start, end):
+        """Return option legs expiring between start and end, inclusive."""
+        lo = np.searchsorted(self._expiry_values, pd.Timestamp(start).to_datetime64(), side='left')
+        hi = np.searchsorted(self._expiry_values, pd.Timestamp(end).to_datetime64(), side='right')
+        return self._select(self._expiry_rows[lo:hi])
+
+    def expiring_within(self, days, today=None):
+        """Return option legs expiring in the next days days, counting today."""
+        start = pd.Timestamp(today or pd.Timestamp.now()).normalize()
+        return self.expiring_between(start, start + pd.Timedelta(days=days))
+
+    def _strike_rows(self, symbol, put_call, low, high):
+        strikes, rows = self._strikes.get((symbol, put_call), (np.empty(0), np.empty(0, dtype=int)))
+        lo = np.searchsorted(strikes, low, side='left')
+        hi = np.searchsorted(strikes, high, side='right')
+        return rows[lo:hi]
+
+    def strike_range(self, symbol, put_call, low, high):
+        """Return the symbol's put or call legs with strikes between low and high."""
+        return self._select(self._strike_rows(symbol, put_call, low, high))
+
+    def _build_short_put_distances(self):
+        """Sort short puts by the distance of their strike from spot.
+
+        Returns the sorted arrays and, separately, the short puts whose
+        underlying has no spot price so reports can list them.
+        """
+        priced, unpriced = [np.empty(0, dtype=int)], [np.empty(0, dtype=int)]
+        for (symbol, put_call), (_, positions) in self._strikes.items():
+            if put_call == 'PUT':
+                (priced if symbol in self.spot_prices else unpriced).append(positions)
+        rows = np.concatenate(priced)
+        rows = rows[self._quantities[rows] < 0]
+        unpriced = np.sort(np.concatenate(unpriced))
+        unpriced = unpriced[self._quantities[unpriced] < 0]
+        spot = self.legs['Symbol'].iloc[rows].astype(object).map(self.spot_prices).to_numpy(dtype=float)
+        from_spot = (self._strike_values[rows] / spot - 1) * 100
+        order = np.argsort(np.abs(from_spot), kind='stable')
+        return (np.abs(from_spot[order]) / 100, rows[order], spot[order], from_spot[order]), unpriced
+
+    def short_puts_near_spot(self, pct=0.05):
+        """Return short puts struck within pct of their underlying's spot price."""
+        distances, rows, spot, from_spot = self._short_put_distances
+        count = np.searchsorted(distances, pct, side='right')
+        result = self._select(rows[:count]).copy()
+        result['Spot'] = spot[:count]
+        result['% From Spot'] = from_spot[:count]
+        return result
+
+    def short_puts_without_spot(self):
+        """Return short puts left out of short_puts_near_spot for lack of a spot price."""
+        return self._select(self._unpriced_short_puts)
+
+    def assignment_exposure_by_date(self):
+        """Return the short put and short call notional per expiration date."""
+        return self._assignment_exposure
+
+def run_report(title, query):
+    """Run query, then print its result and how long it took."""
+    start = time.perf_counter()
+    result = query()
+    elapsed = (time.perf_counter() - start) * 1000
+    print(f"\n{title} ({len(result)} rows, {elapsed:.3f} ms)")
+    print("===================================")
+    if result.empty:
+        print("No matching positions.")
+    else:
+        print(result.to_string())
+
+def prompt_number(prompt, default):
+    """Read a number from the user, falling back to default."""
+    value = input(f"{prompt} [{default}]: ").strip()
+    try:
+        return float(value) if value else default
+    except ValueError:
+        print(f"Invalid number, using {default}.")
+        return default
+
+def process_position_reports():
+    """Fetch all accounts once and answer position queries from the index."""
+    try:
+        print("Starting position report...")
+        legs, current_prices = fetch_consolidated_legs()
+        if legs.empty:
+            print("No data available")
+            return False
+
+        # Quote short-put underlyings that no account holds shares of; any
+        # still unpriced are listed as skipped by the short puts report
+        missing = short_put_symbols(legs) - set(estimate_spot_prices(legs, current_prices))
+        if missing:
+            print(f"\nFetching quotes for {len(missing)} underlying(s) without a spot price...")
+            current_prices = {**current_prices, **fetch_tda_quotes(sorted(missing))}
+
+        start = time.perf_counter()
+        index = PositionIndex(legs, current_prices)
+        print(f"\nIndexed {len(legs)} legs in {(time.perf_counter() - start) * 1000:.1f} ms")
+        input("\nPress Enter to continue...")
+
+        while True:
+            clear_screen()
+            print("\nPosition Reports")
+            print("===================================")
+            print("1. Legs expiring soon")
+            print("2. Short puts near spot")
+            print("3. Assignment exposure by date")
+            print("4. Legs by strike range")
+            print("5. Back to Main Menu")
+            print("===================================")
+            choice = input("\nEnter your choice (1-5): ")
+
+            if choice == "1":
+                days = prompt_number("Days ahead", 7)
+                run_report(f"Legs expiring in the next {days:g} days",
+                           lambda: index.expiring_within(days)[REPORT_COLUMNS])
+            elif choice == "2":
+                pct = prompt_number("Percent from spot", 5)
+                run_report(f"Short puts within {pct:g}% of spot",
+                           lambda: index.short_puts_near_spot(pct / 100)[REPORT_COLUMNS + ['Spot', '% From Spot']])
+                if not index.short_puts_without_spot().empty:
+                    run_report("Short puts skipped for lack of a spot price",
+                               lambda: index.short_puts_without_spot()[REPORT_COLUMNS])
+            elif choice == "3":
+                run_report("Assignment exposure by date", index.assignment_exposure_by_date)
+            elif choice == "4":
+                symbol = input("Symbol: ").strip().upper()
+                put_call = input("PUT or CALL: ").strip().upper()
+                low = prompt_number("Lowest strike", 0)
+                high = prompt_number("Highest strike", float('inf'))
+                run_report(f"{symbol} {put_call} legs struck {low:g}-{high:g}",
+                           lambda: index.strike_range(symbol, put_call, low, high)[REPORT_COLUMNS])
+            elif choice == "5":
+                return True
+            else:
+                print("\nInvalid choice. Please enter a number from 1 to 5.")
+            input("\nPress Enter to continue...")
+
+    except Exception as e:
+        print(f"An error occurred while running position reports: {str(e)}")
+        return False
@@ -0,0 +1,72 @@
+import pandas as pd
+
+# Typed layout shared by the TDA and E*TRADE portfolio frames. Description
+# stays a plain string column: it is unique per leg, so categories would
+# only add an index on top of the same strings.
+CATEGORY_COLUMNS = ['Broker', 'Account', 'Symbol', 'Asset Type', 'Put/Call']
+FLOAT_COLUMNS = [
+    'Quantity',
+    'Market Value',
+    'Trade Price',
+    'Average Price',
+    'Average Long Price',
+    'Average Short Price',
+    'Strike Price',
+    'Call/Put Price',
+]
+DATE_COLUMNS = ['Expiration Date']
+# TDA writes MM/DD/YYYY, E*TRADE writes YYYY-M-D
+EXPIRATION_FORMATS = ['%m/%d/%Y', '%Y-%m-%d']
+OPTION_TYPES = ['OPTION', 'OPTN']
+
+def parse_expiration(values):
+    """Parse TDA and E*TRADE expiration strings into datetime64, NaT if blank."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values
+    parsed = pd.Series(pd.NaT, index=values.index, dtype='datetime64[ns]')
+    for fmt in EXPIRATION_FORMATS:
+        parsed = parsed.fillna(pd.to_datetime(values, format=fmt, errors='coerce'))
+    return parsed
+
+def apply_position_schema(portfolio_data, validate=True):
+    """Return portfolio_data with categorical, float64 and datetime64 columns.
+
+    Low-cardinality text columns become categories, prices and quantities
+    float64 and Expiration Date datetime64. Other columns are left as they
+    are. Values that cannot be converted become NaN/NaT and are reported by
+    validate_positions unless validate is False.
+    """
+    if portfolio_data.empty:
+        return portfolio_data
+    typed = portfolio_data.copy()
+    for column in CATEGORY_COLUMNS:
+        if column in typed:
+            typed[column] = typed[column].astype('category')
+    for column in FLOAT_COLUMNS:
+        if column in typed:
+            typed[column] = pd.to_numeric(typed[column], errors='coerce').astype('float64')
+    for column in DATE_COLUMNS:
+        if column in typed:
+            typed[column] = parse_expiration(typed[column])
+    if validate:
+        validate_positions(portfolio_data, typed)
+    return typed
+
+def validate_positions(raw, typed):
+    """Print a warning for each kind of value lost or missing at ingest."""
+    problems = {}
+    for column in FLOAT_COLUMNS + DATE_COLUMNS:
+        # Numeric and datetime input cannot lose values on conversion
+        if column in typed and raw[column].dtype == object:
+            present = raw[column].notna() & (raw[column] != '')
+            problems[f"unreadable {column}"] = (present & typed[column].isna()).sum()
+    problems["missing Symbol"] = typed['Symbol'].isna().sum()
+    if 'Asset Type' in typed:
+        options = typed['Asset Type'].isin(OPTION_TYPES)
+        if 'Expiration Date' in typed:
+            problems["options without Expiration Date"] = (options & typed['Expiration Date'].isna()).sum()
+        if 'Call/Put Price' in typed:
+            problems["options without a strike"] = (options & typed['Call/Put Price'].isna()).sum()
+    for problem, count in problems.items():
+        if count:
+            print(f"Warning: {count} position(s) with {problem}")
@@ -0,0 +1,231 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+from dotenv import load_dotenv
+import schwabdev
+
+TOKENS_FILE = 'tokens.json'
+ACCESS_TOKEN_TIMEOUT = timedelta(seconds=1800)  # From Schwab
+# schwabdev forces a browser login once the refresh token is 6 days old,
+# a day before Schwab's 7-day limit
+REFRESH_TOKEN_TIMEOUT = timedelta(days=6)
+ACCESS_REFRESH_MARGIN = timedelta(minutes=5)  # Refresh this long before the access token lapses
+REFRESH_WARNING_MARGIN = timedelta(days=2)  # Warn this long before a browser login is needed
+MIN_REFRESH_INTERVAL = 30  # Seconds between background checks at the least
+MAX_REFRESH_BACKOFF = 1800  # Longest wait between retries after failed refreshes
+
+def delete_token_file():
+    """Delete the token.json file if it exists."""
+    token_file_path = TOKENS_FILE
+    try:
+        if os.path.exists(token_file_path):
+            os.remove(token_file_path)
+            print("Deleted old tokens.json file.")
+        else:
+            print("No tokens.json file found to delete.")
+    except Exception as e:
+        print(f"Error deleting tokens.json: {str(e)}")
+
+def attempt_authentication(use_existing_tokens=True):
+    """Helper function to attempt authentication and return client."""
+    load_dotenv()
+    app_key = os.getenv('app_key')
+    app_secret = os.getenv('app_secret')
+    callback_url = os.getenv('callback_url')
+
+    if not all([app_key, app_secret, callback_url]):
+        raise ValueError("Missing required environment variables. Please check your .env file.")
+
+    try:
+        if use_existing_tokens and os.path.exists(TOKENS_FILE):
+            print("Attempting to use existing tokens...")
+            return schwabdev.Client(app_key, app_secret, callback_url)
+    except Exception as e:
+        print(f"Error using existing tokens: {e}")
+
+    print("\nStarting fresh authentication process...")
+    print("Please complete the authentication in your browser when it opens...")
+
+    delete_token_file()  # Clear tokens before starting new authentication
+    return schwabdev.Client(app_key, app_secret, callback_url)
+
+def read_token_times(tokens_file=TOKENS_FILE):
+    """Return the (access, refresh) token issue times from tokens.json, or (None, None)."""
+    try:
+        with open(tokens_file, 'r') as f:
+            tokens = json.load(f)
+        return (datetime.fromisoformat(tokens['access_token_issued']),
+                datetime.fromisoformat(tokens['refresh_token_issued']))
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+def check_health(tokens_file=TOKENS_FILE, now=None):
+    """Report the state of the Schwab tokens without contacting the API.
+
+    Returns a dict with a status of 'ok', 'warning', 'expired' or 'missing',
+    the time left on each token and a message for the user.
+    """
+    now = now or datetime.now()
+    access_issued, refresh_issued = read_token_times(tokens_file)
+    if refresh_issued is None:
+        return {
+            'status': 'missing',
+            'access_expires_in': None,
+            'refresh_expires_in': None,
+            'message': "No valid tokens.json found. A browser login is required.",
+        }
+
+    access_expires_in = access_issued + ACCESS_TOKEN_TIMEOUT - now
+    refresh_expires_in = refresh_issued + REFRESH_TOKEN_TIMEOUT - now
+    if refresh_expires_in <= timedelta(0):
+        status = 'expired'
+        message = "The refresh token has expired. A browser login is required."
+    elif refresh_expires_in <= REFRESH_WARNING_MARGIN:
+        status = 'warning'
+        message = (f"The refresh token expires in {format_timedelta(refresh_expires_in)}. "
+                   "Re-authenticate soon to avoid a browser login mid-update.")
+    else:
+        status = 'ok'
+        message = f"Tokens are valid. The refresh token expires in {format_timedelta(refresh_expires_in)}."
+    return {
+        'status': status,
+        'access_expires_in': access_expires_in,
+        'refresh_expires_in': refresh_expires_in,
+        'message': message,
+    }
+
+def format_timedelta(delta):
+    """Format a timedelta as days, hours and minutes."""
+    minutes = max(int(delta.total_seconds() // 60), 0)
+    days, minutes = divmod(minutes, 24 * 60)
+    hours, minutes = divmod(minutes, 60)
+    if days:
+        return f"{days}d {hours}h"
+    return f"{hours}h {minutes}m"
+
+class CredentialManager:
+    """Keep one Schwab client alive and refresh its access token before it lapses.
+
+    The client is created on first use. A daemon thread then wakes shortly
+    before each access token expires and refreshes it, so requests never
+    wait on a token refresh. Failed refreshes are retried with exponential
+    backoff and reported through check_health() rather than printed, since
+    the thread runs underneath the interactive menus. Refresh-token expiry
+    cannot be renewed without a browser login, so it is only reported.
+    """
+
+    def __init__(self, tokens_file=TOKENS_FILE):
+        self.tokens_file = tokens_file
+        self.client = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()  # Held for the length of one token refresh
+        self._stop = threading.Event()
+        self._thread = None
+        self._refresh_failures = 0
+        self._last_refresh_error = None
+        self._last_refresh_failure = None
+
+    def get_client(self):
+        """Return an authenticated client whose access token is not about to lapse."""
+        with self._lock:
+            if self.client is None:
+                health = check_health(self.tokens_file)
+                if health['status'] == 'warning':
+                    print(f"Warning: {health['message']}")
+                self.client = attempt_authentication()
+            client = self.client
+        self._refresh_if_needed(client)
+        self._start_refresher()
+        return client
+
+    def reset(self):
+        """Drop the cached client so the next get_client() builds a new one."""
+        with self._lock:
+            self.client = None
+
+    def reauthenticate(self):
+        """Discard the current tokens and run a fresh browser login."""
+        with self._lock:
+            self.client = attempt_authentication(use_existing_tokens=False)
+            self._refresh_failures = 0
+        self._start_refresher()
+        return self.client
+
+    def check_health(self):
+        """Report token state from tokens.json and any failed background refreshes."""
+        health = check_health(self.tokens_file)
+        if self._refresh_failures:
+            if health['status'] == 'ok':
+                health['status'] = 'warning'
+            health['message'] += (
+                f" Access token refresh has failed {self._refresh_failures} time(s) in a row, most recently at "
+                f"{self._last_refresh_failure:%H:%M:%S} ({self._last_refresh_error})."
+            )
+        return health
+
+    def stop(self):
+        """Stop the background refresher."""
+        self._stop.set()
+
+    def _seconds_until_refresh(self):
+        if self._refresh_failures:
+            return min(MIN_REFRESH_INTERVAL * 2 ** self._refresh_failures, MAX_REFRESH_BACKOFF)
+        access_issued, _ = read_token_times(self.tokens_file)
+        if access_issued is None:
+            return MIN_REFRESH_INTERVAL
+        refresh_at = access_issued + ACCESS_TOKEN_TIMEOUT - ACCESS_REFRESH_MARGIN
+        return max((refresh_at - datetime.now()).total_seconds(), MIN_REFRESH_INTERVAL)
+
+    def _refresh_if_needed(self, client):
+        """Refresh client's access token if it expires within ACCESS_REFRESH_MARGIN.
+
+        schwabdev posts to the token endpoint without a timeout, so the
+        refresh runs outside _lock and only the failure count is updated
+        under it. A caller that finds a refresh already running skips it
+        instead of waiting; the access token is still good until the
+        margin runs out.
+        """
+        health = check_health(self.tokens_file)
+        if health['status'] in ('missing', 'expired'):
+            return
+        if health['access_expires_in'] > ACCESS_REFRESH_MARGIN:
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            access_issued, _ = read_token_times(self.tokens_file)
+            error = "the token endpoint rejected the refresh"
+            try:
+                # schwabdev 1.0.0 only refreshes a minute before expiry on its own
+                client._update_access_token()
+            except Exception as e:
+                error = str(e)
+            # _update_access_token prints failures instead of raising, so check
+            # whether tokens.json actually got a new access token
+            refreshed = read_token_times(self.tokens_file)[0] != access_issued
+        finally:
+            self._refresh_lock.release()
+        with self._lock:
+            if refreshed:
+                self._refresh_failures = 0
+            else:
+                self._refresh_failures += 1
+                self._last_refresh_error = error
+                self._last_refresh_failure = datetime.now()
+
+    def _start_refresher(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run_refresher, daemon=True)
+        self._thread.start()
+
+    def _run_refresher(self):
+        while not self._stop.wait(self._seconds_until_refresh()):
+            with self._lock:
+                client = self.client
+            if client is not None:
+                self._refresh_if_needed(client)
+
+credentials = CredentialManager()
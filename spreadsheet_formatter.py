@@ -1,3 +1,4 @@
+import numpy as np
 import pandas as pd
 import xlsxwriter
 import re
@@ -56,6 +57,77 @@ def extract_expiration_and_call_price(description):
         
     return expiration_date, strike_price
 
+def format_expiration(expiration_date):
+    """Format an expiration date as MM/DD for the template, '' if missing."""
+    if pd.isna(expiration_date):
+        return ""
+    if isinstance(expiration_date, str):
+        return expiration_date
+    return expiration_date.strftime("%m/%d")
+
+EQUITY_TYPES = ['EQUITY', 'COLLECTIVE_INVESTMENT', 'EQ']
+MAX_PUTS = 10  # Columns O-Y
+MAX_CALLS = 11  # Columns C-M
+# The columns populate_template and populate_template_tda read from a row
+TEMPLATE_COLUMNS = [
+    'Description',
+    'Quantity',
+    'Average Price',
+    'Average Long Price',
+    'Average Short Price',
+    'Expiration Date',
+    'Call/Put Price',
+]
+
+def column_values(values):
+    """Return a column as a list, with datetimes as datetime.datetime and NaT as None."""
+    if pd.api.types.is_datetime64_dtype(values):
+        # numpy converts in C, while Series.tolist boxes a Timestamp per value
+        return values.to_numpy().astype('datetime64[us]').tolist()
+    return values.tolist()
+
+def split_positions(portfolio_data):
+    """Split positions into the rows each symbol's sheet shows.
+
+    The equity, put and call filters and the expiration/strike sort run
+    once on the whole frame. Only the rows the template has room for are
+    kept, and their TEMPLATE_COLUMNS are turned into dicts in one pass, so
+    each sheet slices a list rather than the frame. Returns a dict of
+    symbol to (equity_rows, put_rows, call_rows), each a list of row dicts
+    in sheet order.
+    """
+    symbol_dtype = portfolio_data['Symbol'].astype('category').dtype
+    symbols = symbol_dtype.categories.tolist()
+
+    def rows_by_symbol(frame, sort_by, limit):
+        if frame.empty:
+            return {}
+        frame = frame.sort_values(['Symbol'] + sort_by, kind='stable')
+        codes = frame['Symbol'].astype(symbol_dtype).cat.codes.to_numpy()
+        first = np.r_[True, codes[1:] != codes[:-1]]
+        starts = np.flatnonzero(first)
+        group = np.cumsum(first) - 1
+        keep = np.arange(len(codes)) - starts[group] < limit
+        kept = frame[keep]
+        columns = [column for column in TEMPLATE_COLUMNS if column in kept]
+        records = [dict(zip(columns, row)) for row in zip(*(column_values(kept[column]) for column in columns))]
+        ends = np.cumsum(np.bincount(group[keep], minlength=len(starts)))
+        begins = np.r_[0, ends[:-1]]
+        return {
+            symbols[code]: records[begin:end]
+            for code, begin, end in zip(codes[starts], begins, ends)
+            if code >= 0  # Rows without a symbol
+        }
+
+    option_order = ['Expiration Date', 'Call/Put Price']
+    equity = rows_by_symbol(portfolio_data[portfolio_data['Asset Type'].isin(EQUITY_TYPES)], [], 1)
+    puts = rows_by_symbol(portfolio_data[portfolio_data['Put/Call'] == 'PUT'], option_order, MAX_PUTS)
+    calls = rows_by_symbol(portfolio_data[portfolio_data['Put/Call'] == 'CALL'], option_order, MAX_CALLS)
+    return {
+        symbol: (equity.get(symbol, []), puts.get(symbol, []), calls.get(symbol, []))
+        for symbol in portfolio_data['Symbol'].dropna().unique()
+    }
+
 def adjust_empty_columns_width(worksheet, used_columns, start_col, end_col):
     """Adjust the width of empty columns to 1/3 of their current width."""
     for col in range(start_col, end_col + 1):
@@ -123,7 +195,7 @@ def format_sheet(writer, symbol, average_price, account_id):
             worksheet.write(f'{chr(i)}{j}', f'=IF($A{j}<${chr(i)}$9, 0, ${chr(i)}$8*($A{j}-${chr(i)}$9)*100 )')
     for i in range(79, 90):  # O through Y columns for puts
         for j in range(10, 45):
-            worksheet.write(f'{chr(i)}{j}', f'=IF( A{j}>${chr(i)}$9, 0,  ${chr(i)}$8*(${chr(i)}$9-A10 )*100)')
+            worksheet.write(f'{chr(i)}{j}', f'=IF( A{j}>${chr(i)}$9, 0,  ${chr(i)}$8*(${chr(i)}$9-A{j} )*100)')
     worksheet.write('AA47', '=SUM(B47)')
     worksheet.write('AA48', '=SUM(A48:Z48)')
     # Write formulas for row 48 (includes K, L, M columns now)
@@ -132,15 +204,16 @@ def format_sheet(writer, symbol, average_price, account_id):
     for i in range(79, 90):  # O through Y
         worksheet.write(f'{chr(i)}48', f'={chr(i)}49*-{chr(i)}8*100')
 
-def populate_template_tda(writer, symbol, data):
-    """Populate the template for a given symbol with its positions."""
+def populate_template_tda(writer, symbol, equity_rows, put_rows, call_rows):
+    """Populate the template for a given symbol with its positions.
+
+    Takes the symbol's rows from split_positions.
+    """
     worksheet = writer.sheets[symbol]
     used_columns = set()
 
-    # Filter EQUITY and COLLECTIVE_INVESTMENT data
-    equity_data = data[data['Asset Type'].isin(['EQUITY', 'COLLECTIVE_INVESTMENT', 'EQ'])]
-    if not equity_data.empty:
-        equity_row = equity_data.iloc[0]
+    if equity_rows:
+        equity_row = equity_rows[0]
         average_long_price = equity_row.get('Average Long Price', 0)
         average_short_price = equity_row.get('Average Short Price', 0)
         worksheet.write_number('B8', equity_row['Quantity'])
@@ -150,17 +223,13 @@ def populate_template_tda(writer, symbol, data):
             worksheet.write_number('B9', average_long_price)
         used_columns.add(2)
 
-    # Filter PUT and CALL data
-    put_data = data[data['Put/Call'] == 'PUT'].sort_values(by=['Expiration Date', 'Call/Put Price'])
-    call_data = data[data['Put/Call'] == 'CALL'].sort_values(by=['Expiration Date', 'Call/Put Price'])
-
     # Populate PUTs (columns O-Y)
     put_columns = list(range(15, 25))  # Columns O-Y
-    for idx, (_, put) in enumerate(put_data.iterrows()):
+    for idx, put in enumerate(put_rows):
         if idx >= len(put_columns):
             break
         col_letter = chr(put_columns[idx] + 64)
-        worksheet.write(f'{col_letter}7', put['Expiration Date'])  # Write expiration date
+        worksheet.write(f'{col_letter}7', format_expiration(put['Expiration Date']))
         worksheet.write_number(f'{col_letter}8', put['Quantity'])
         try:
             worksheet.write_number(f'{col_letter}9', put['Call/Put Price'])
@@ -172,11 +241,11 @@ def populate_template_tda(writer, symbol, data):
 
     # Populate CALLs (columns C-M)
     call_columns = list(range(3, 14))  # Columns C-M
-    for idx, (_, call) in enumerate(call_data.iterrows()):
+    for idx, call in enumerate(call_rows):
         if idx >= len(call_columns):
             break
         col_letter = chr(call_columns[idx] + 64)
-        worksheet.write(f'{col_letter}7', call['Expiration Date'])  # Write expiration date
+        worksheet.write(f'{col_letter}7', format_expiration(call['Expiration Date']))
         worksheet.write_number(f'{col_letter}8', call['Quantity'])
         try:
             worksheet.write_number(f'{col_letter}9', call['Call/Put Price'])
@@ -190,15 +259,16 @@ def populate_template_tda(writer, symbol, data):
     adjust_empty_columns_width(worksheet, used_columns, 15, 25)  # Adjust put columns
     adjust_empty_columns_width(worksheet, used_columns, 3, 14)   # Adjust call columns
 
-def populate_template(writer, symbol, data):
-    """Populate the template for a given symbol with its positions."""
+def populate_template(writer, symbol, equity_rows, put_rows, call_rows):
+    """Populate the template for a given symbol with its positions.
+
+    Takes the symbol's rows from split_positions.
+    """
     worksheet = writer.sheets[symbol]
     used_columns = set()
 
-    # Filter EQUITY and COLLECTIVE_INVESTMENT data
-    equity_data = data[data['Asset Type'].isin(['EQUITY', 'COLLECTIVE_INVESTMENT', 'EQ'])]
-    if not equity_data.empty:
-        equity_row = equity_data.iloc[0]
+    if equity_rows:
+        equity_row = equity_rows[0]
         average_long_price = equity_row.get('Average Long Price', 0)
         average_short_price = equity_row.get('Average Short Price', 0)
         worksheet.write_number('B8', equity_row['Quantity'])
@@ -208,13 +278,9 @@ def populate_template(writer, symbol, data):
             worksheet.write_number('B9', average_long_price)
         used_columns.add(2)
 
-    # Filter PUT and CALL data
-    put_data = data[data['Put/Call'] == 'PUT'].sort_values(by=['Expiration Date', 'Call/Put Price'])
-    call_data = data[data['Put/Call'] == 'CALL'].sort_values(by=['Expiration Date', 'Call/Put Price'])
-
     # Populate PUTs (columns O-Y)
     put_columns = list(range(15, 25))  # Columns O-Y
-    for idx, (_, put) in enumerate(put_data.iterrows()):
+    for idx, put in enumerate(put_rows):
         if idx >= len(put_columns):
             break
         col_letter = chr(put_columns[idx] + 64)
@@ -231,7 +297,7 @@ def populate_template(writer, symbol, data):
 
     # Populate CALLs (columns C-M)
     call_columns = list(range(3, 14))  # Columns C-M
-    for idx, (_, call) in enumerate(call_data.iterrows()):
+    for idx, call in enumerate(call_rows):
         if idx >= len(call_columns):
             break
         col_letter = chr(call_columns[idx] + 64)